@@ -0,0 +1,275 @@
+import numpy as np
+from numba import njit
+
+"""
+    解读：
+        Board的核心循环 用Numba编译成机器码
+        所有函数只接收NumPy数组和整数 不碰Point Player这些Python对象
+        数组按带边框的一维编号排布 邻居就是 index-stride index+stride index-1 index+1
+        棋块的气不存集合 只在根上存伪气的个数 编号和 编号平方和三个整数
+            一个空点挨着棋块的几个子 就算几口伪气
+            伪气个数为0 就是没气
+            所有伪气编号都相同（个数*平方和 == 和*和）就是只剩一口气 这口气就是 和/个数
+            真正的气数要沿着next_stone环现数
+        写数组都经过_write 日志长度trail_size[0]为-1时不记日志 否则把 (数组, 下标, 原值) 记进trail
+"""
+
+EMPTY = 0
+BLACK = 1
+WHITE = 2
+OFF_BOARD = -1
+
+# 日志里区分被写的是哪个数组
+_COLOR = 0
+_GROUP = 1
+_RANK = 2
+_NEXT_STONE = 3
+_LIBERTY_COUNT = 4
+_LIBERTY_SUM = 5
+_LIBERTY_SQUARES = 6
+
+
+@njit(cache=True)
+def _write(values, which, index, value, trail, trail_size):
+    size = trail_size[0]
+    if size >= 0:
+        trail[size, 0] = which
+        trail[size, 1] = index
+        trail[size, 2] = values[index]
+        trail_size[0] = size + 1
+    values[index] = value
+
+
+# 给棋块的根加上count口伪气 它们的编号和是total 编号平方和是squares
+# liberties的三行分别是伪气个数 编号和 编号平方和
+@njit(cache=True)
+def _add_liberties(liberties, root, count, total, squares, trail, trail_size):
+    _write(liberties[0], _LIBERTY_COUNT, root, liberties[0, root] + count,
+           trail, trail_size)
+    _write(liberties[1], _LIBERTY_SUM, root, liberties[1, root] + total,
+           trail, trail_size)
+    _write(liberties[2], _LIBERTY_SQUARES, root, liberties[2, root] + squares,
+           trail, trail_size)
+
+
+# 给棋块的根加(sign=1)或减(sign=-1)一口编号为point的伪气
+@njit(cache=True)
+def _change_liberty(liberties, root, point, sign, trail, trail_size):
+    _add_liberties(liberties, root, sign, sign * point, sign * point * point,
+                   trail, trail_size)
+
+
+# 只剩一口气 伪气个数大于0且所有伪气是同一个点
+@njit(cache=True)
+def in_atari(liberties, root):
+    count = liberties[0, root]
+    total = liberties[1, root]
+    return count > 0 and count * liberties[2, root] == total * total
+
+
+# 找棋块的根 两遍扫描 第二遍把路径上的点直接挂到根上（路径压缩）
+@njit(cache=True)
+def find(group, index, trail, trail_size):
+    root = index
+    while group[root] != root:
+        root = group[root]
+    while group[index] != root:
+        next_index = group[index]
+        _write(group, _GROUP, index, root, trail, trail_size)
+        index = next_index
+    return root
+
+
+# 只读地找棋块的根 不做路径压缩 查询棋盘时用 免得留下没记日志的修改
+@njit(cache=True)
+def find_root(group, index):
+    while group[index] != index:
+        index = group[index]
+    return index
+
+
+# 合并两个棋块的根 返回新的根
+@njit(cache=True)
+def _union(group, rank, next_stone, liberties, root_a, root_b,
+           trail, trail_size):
+    if root_a == root_b:
+        return root_a
+    # 按秩合并 矮的树挂到高的树下面
+    if rank[root_a] < rank[root_b]:
+        root_a, root_b = root_b, root_a
+    _write(group, _GROUP, root_b, root_a, trail, trail_size)
+    if rank[root_a] == rank[root_b]:
+        _write(rank, _RANK, root_a, rank[root_a] + 1, trail, trail_size)
+    # 交换两个环的后继 两个环就接成了一个
+    next_a = next_stone[root_a]
+    _write(next_stone, _NEXT_STONE, root_a, next_stone[root_b],
+           trail, trail_size)
+    _write(next_stone, _NEXT_STONE, root_b, next_a, trail, trail_size)
+    # 伪气直接相加
+    for row in range(3):
+        _write(liberties[row], _LIBERTY_COUNT + row, root_a,
+               liberties[row, root_a] + liberties[row, root_b],
+               trail, trail_size)
+    return root_a
+
+
+# 数棋块真正的气数 marks是全为0的临时数组 用来给数过的气做记号 数完还原
+@njit(cache=True)
+def count_liberties(color, next_stone, marks, stride, root):
+    count = 0
+    index = root
+    while True:
+        for neighbor in (index - stride, index + stride, index - 1, index + 1):
+            if color[neighbor] == EMPTY and marks[neighbor] == 0:
+                marks[neighbor] = 1
+                count += 1
+        index = next_stone[index]
+        if index == root:
+            break
+    while True:
+        for neighbor in (index - stride, index + stride, index - 1, index + 1):
+            marks[neighbor] = 0
+        index = next_stone[index]
+        if index == root:
+            break
+    return count
+
+
+# 把每个子所在棋块的气数写进out 0没气 1只剩一口气 2两口及以上 空点和边框为0
+@njit(cache=True)
+def liberty_levels(color, group, next_stone, liberties, out):
+    out[:] = 0
+    for root in range(color.size):
+        if color[root] <= EMPTY or group[root] != root:
+            continue
+        if liberties[0, root] == 0:
+            continue
+        level = 1 if in_atari(liberties, root) else 2
+        index = root
+        while True:
+            out[index] = level
+            index = next_stone[index]
+            if index == root:
+                break
+
+
+# 提子 返回提掉的子数和哈希的变化量
+# 棋块的子相邻的子要么同属这个棋块 要么是对方的 所以清子和给对方加伪气可以在一遍里做完
+# 挨着的对方子多半属于同一个棋块 伪气先攒着 换了根再一次写进去
+@njit(cache=True)
+def _remove_string(color, group, next_stone, liberties, hash_codes, stride,
+                   root, trail, trail_size):
+    removed = color[root]
+    other = BLACK + WHITE - removed
+    codes = hash_codes[removed]
+    captured = 0
+    hash_delta = np.uint64(0)
+    pending_root = -1
+    count = 0
+    total = 0
+    squares = 0
+    index = root
+    while True:
+        hash_delta ^= codes[index]
+        _write(color, _COLOR, index, EMPTY, trail, trail_size)
+        _write(group, _GROUP, index, -1, trail, trail_size)
+        captured += 1
+        for neighbor in (index - stride, index + stride, index - 1, index + 1):
+            if color[neighbor] != other:
+                continue
+            neighbor_root = find(group, neighbor, trail, trail_size)
+            if neighbor_root != pending_root:
+                if count > 0:
+                    _add_liberties(liberties, pending_root, count, total,
+                                   squares, trail, trail_size)
+                pending_root = neighbor_root
+                count = 0
+                total = 0
+                squares = 0
+            count += 1
+            total += index
+            squares += index * index
+        index = next_stone[index]
+        if index == root:
+            break
+    if count > 0:
+        _add_liberties(liberties, pending_root, count, total, squares,
+                       trail, trail_size)
+    return captured, hash_delta
+
+
+# 把root记进最多4格的roots 前n格里已经有了就不记 返回新的n
+@njit(cache=True)
+def _add_root(roots, n, root):
+    for k in range(n):
+        if roots[k] == root:
+            return n
+    roots[n] = root
+    return n + 1
+
+
+# 在index上落一个player(BLACK或WHITE)的子 合并己方棋块 提掉没气的敌方棋块
+# 返回提掉的子数和哈希的变化量 自杀的子留在棋盘上 由调用者判断
+@njit(cache=True)
+def place(color, group, rank, next_stone, liberties, hash_codes, stride,
+          index, player, trail, trail_size):
+    # 新子自己成为一个棋块
+    _write(color, _COLOR, index, player, trail, trail_size)
+    _write(group, _GROUP, index, index, trail, trail_size)
+    _write(rank, _RANK, index, 0, trail, trail_size)
+    _write(next_stone, _NEXT_STONE, index, index, trail, trail_size)
+    for row in range(3):
+        _write(liberties[row], _LIBERTY_COUNT + row, index, 0,
+               trail, trail_size)
+    hash_delta = hash_codes[player, index]
+    # 相邻的己方 敌方棋块的根 一个点最多4个 去重后分别放进same和opposite
+    same = np.empty(4, np.int64)
+    opposite = np.empty(4, np.int64)
+    num_same = 0
+    num_opposite = 0
+    # 空邻居是新子的伪气 有子的邻居不管哪一方都少了index这口伪气
+    for neighbor in (index - stride, index + stride, index - 1, index + 1):
+        neighbor_color = color[neighbor]
+        if neighbor_color == EMPTY:
+            _change_liberty(liberties, index, neighbor, 1, trail, trail_size)
+        elif neighbor_color > EMPTY:
+            root = find(group, neighbor, trail, trail_size)
+            _change_liberty(liberties, root, index, -1, trail, trail_size)
+            if neighbor_color == player:
+                num_same = _add_root(same, num_same, root)
+            else:
+                num_opposite = _add_root(opposite, num_opposite, root)
+    # 和所有相邻的己方棋块合并
+    root = index
+    for k in range(num_same):
+        root = _union(group, rank, next_stone, liberties, root, same[k],
+                      trail, trail_size)
+    # 相邻的敌方棋块没气了就提掉 提子不会改动其他敌方棋块的根
+    captured = 0
+    for k in range(num_opposite):
+        if liberties[0, opposite[k]] == 0:
+            count, delta = _remove_string(color, group, next_stone, liberties,
+                                          hash_codes, stride, opposite[k],
+                                          trail, trail_size)
+            captured += count
+            hash_delta ^= delta
+    return captured, hash_delta
+
+
+# 把日志的[start, end)段倒着放一遍 撤销对数组的修改
+@njit(cache=True)
+def undo(color, group, rank, next_stone, liberties, trail, start, end):
+    for k in range(end - 1, start - 1, -1):
+        which = trail[k, 0]
+        index = trail[k, 1]
+        value = trail[k, 2]
+        if which == _COLOR:
+            color[index] = value
+        elif which == _GROUP:
+            group[index] = value
+        elif which == _RANK:
+            rank[index] = value
+        elif which == _NEXT_STONE:
+            next_stone[index] = value
+        else:
+            liberties[which - _LIBERTY_COUNT, index] = value
@@ -1,7 +1,3 @@
-# tag::helpersimport[]
-from dlgo.gotypes import Point
-# end::helpersimport[]
-
 __all__ = [
     'is_point_an_eye',
 ]
@@ -11,27 +7,19 @@ __all__ = [
 def is_point_an_eye(board, point, color):
     if board.get(point) is not None:  # <1>
         return False
-    for neighbor in point.neighbors():  # <2>
-        if board.is_on_grid(neighbor):
-            neighbor_color = board.get(neighbor)
-            if neighbor_color != color:
-                return False
+    for neighbor in board.neighbors(point):  # <2>
+        neighbor_color = board.get(neighbor)
+        if neighbor_color != color:
+            return False
 
     friendly_corners = 0  # <3>
-    off_board_corners = 0
-    corners = [
-        Point(point.row - 1, point.col - 1),
-        Point(point.row - 1, point.col + 1),
-        Point(point.row + 1, point.col - 1),
-        Point(point.row + 1, point.col + 1),
-    ]
+    # 棋盘只给出棋盘内的斜角 不用逐个判断是否出界
+    corners = board.corners(point)
+    off_board_corners = 4 - len(corners)
     for corner in corners:
-        if board.is_on_grid(corner):
-            corner_color = board.get(corner)
-            if corner_color == color:
-                friendly_corners += 1
-        else:
-            off_board_corners += 1
+        corner_color = board.get(corner)
+        if corner_color == color:
+            friendly_corners += 1
     if off_board_corners > 0:
         return off_board_corners + friendly_corners == 4  # <4>
     return friendly_corners >= 3  # <5>
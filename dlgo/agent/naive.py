@@ -3,7 +3,6 @@ import random
 from dlgo.agent.base import Agent
 from dlgo.agent.helpers import is_point_an_eye
 from dlgo.goboard_slow import Move
-from dlgo.gotypes import Point
 # end::randombotimports[]
 
 
@@ -19,18 +18,16 @@ class RandomBot(Agent):
         """Choose a random valid move that preserves our own eyes."""
         # 候选者落子点数组
         candidates = []
-        # 遍历棋盘的每一个点
-        for r in range(1, game_state.board.num_rows + 1):
-            for c in range(1, game_state.board.num_cols + 1):
-                # 该点的point数据结构
-                candidate = Point(row=r, col=c)
-                # 判断该落子点对于该阵营是否合法
-                if game_state.is_valid_move(Move.play(candidate)) and \
-                        not is_point_an_eye(game_state.board,
-                                            candidate,
-                                            game_state.next_player):
-                    # 若合法 则假如到数组中
-                    candidates.append(candidate)
+        # 遍历棋盘上所有合法的落子点 legal_moves一次性批量判断 比逐点调用is_valid_move快
+        for move in game_state.legal_moves():
+            if not move.is_play:
+                continue
+            # 不填自己的眼
+            if not is_point_an_eye(game_state.board,
+                                   move.point,
+                                   game_state.next_player):
+                # 若合法 则假如到数组中
+                candidates.append(move.point)
         # 若不存在一个合法的落子点 即候选数组为空
         if not candidates:
             # 返回pass
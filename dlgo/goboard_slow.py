@@ -1,15 +1,18 @@
 import numpy as np
 # tag::imports[]
-import copy
 from dlgo.gotypes import Player
 # end::imports[]
 from dlgo.gotypes import Point
 from dlgo.scoring import compute_game_result
+from dlgo import _board_core
+from dlgo import zobrist
 
 __all__ = [
+    'BitBoard',
     'Board',
     'GameState',
     'Move',
+    'UndoRecord',
 ]
 
 """
@@ -17,21 +20,23 @@ __all__ = [
         定义了三个类的数据结构
             GameState是游戏本身 也即游戏的管理者和统筹者
                 其储存一个棋盘Board对象 作为棋盘状况
-                    棋盘维护一个字典
-                        键-棋子位置：值-所属棋块
+                    棋盘用以点编号为下标的NumPy数组维护 外围多一圈OFF_BOARD边框
+                        每个点的颜色
+                        并查集 同一棋块的子有同一个根
+                        把同一棋块的子串起来的环
+                    根节点上存伪气的个数 和 平方和 O(1)判断没气和只剩一口气
+                    落子 提子 撤销的循环在_board_core里用Numba编译
                 每回合其接收一个Move作为行动 以更新棋盘
-        其中 GoString用于构成棋盘
-            棋盘由一个个子组成
-                每个子都被标记了属于特定棋块
-                这样或许方便ai进行分析
-                所属棋块相当于身份 同一棋块的子会被统一对待
+        其中 GoString是get_go_string返回的棋块快照
             棋块储存
                 阵营
                 所有子的位置
                 气的数量和位置
-        棋块和棋盘的棋子字典是冗余的
-            旧的棋块依然存在
-            棋盘字典才是棋盘状况的根本依据
+        试探性落子（判断自杀和劫）用place_stone_with_undo和undo 不再深复制棋盘
+        同一局棋的所有GameState共用一个棋盘 各自记着上一步落子的撤销记录 用到棋盘时沿状态链撤销或重放到这个状态
+            对外的board是只读的视图 读之前自动摆回自己的状态 不能落子
+        棋盘随落子和提子增量维护Zobrist哈希 GameState用历史局面哈希的集合判断劫
+        9路以下的方形棋盘换成BitBoard 黑白各用一个整数的位表示 接口和Board相同
 """
 
 
@@ -40,8 +45,11 @@ class IllegalMoveError(Exception):
 
 
 # 棋块的数据结构 棋块具有阵营属性 棋块中包含有很多子
+# 棋盘内部已经不再保存棋块对象 这里只是get_go_string返回的一份快照
 # tag::strings[]
 class GoString():  # <1>
+    __slots__ = ('color', 'stones', 'liberties')
+
     def __init__(self, color, stones, liberties):
         # 棋块颜色
         self.color = color
@@ -50,26 +58,6 @@ class GoString():  # <1>
         # 气的数量和位置
         self.liberties = set(liberties)
 
-    # 被紧一口气 将气的位置去掉
-    def remove_liberty(self, point):
-        self.liberties.remove(point)
-
-    # 添一口气 应该是被提子了
-    def add_liberty(self, point):
-        self.liberties.add(point)
-
-    # 相连棋块合并
-    def merged_with(self, go_string):  # <2>
-        # 检查双方是否是同一阵营
-        assert go_string.color == self.color
-        # 集合取并集
-        combined_stones = self.stones | go_string.stones
-        # 返回一个船新的棋块 旧的依然存在（可能这就是冗余的原因 处理棋块很潇洒 没必要删了旧的）
-        return GoString(
-            self.color,
-            combined_stones,
-            (self.liberties | go_string.liberties) - combined_stones)
-
     # 计算还有几口气
     @property
     def num_liberties(self):
@@ -84,104 +72,226 @@ class GoString():  # <1>
 
 
 # <1> Go strings are stones that are linked by a chain of connected stones of the same color.
-# <2> Return a new Go string containing all stones in both strings.
 # end::strings[]
 
 
-# 棋盘 数据结构对象 储存了棋盘的大小和一个不知道干嘛用和怎么用的_grid
+# 每个点的颜色 和Player的值一致 棋盘外围一圈是OFF_BOARD 邻居循环里不用再判断出界
+EMPTY = _board_core.EMPTY
+BLACK = _board_core.BLACK
+WHITE = _board_core.WHITE
+OFF_BOARD = _board_core.OFF_BOARD
+
+# 颜色到阵营的对照表 OFF_BOARD是-1 正好取到最后一个None
+_PLAYERS = (None, Player.black, Player.white, None)
+
+
+# 一次落子的撤销记录 按顺序记下落子时对棋盘数组的每一次修改 撤销时倒着还原
+class UndoRecord():
+    __slots__ = ('zobrist_hash', 'changes')
+
+    def __init__(self, zobrist_hash):
+        # 落子前的哈希 撤销时直接还原
+        self.zobrist_hash = zobrist_hash
+        # 修改日志 每行是 (数组, 下标, 原值)
+        self.changes = None
+
+
+# 同样大小的棋盘共用的表和临时数组 挂在按大小特化的Board子类上
+class _SharedArrays():
+    def __init__(self, num_rows, num_cols):
+        stride = num_cols + 2
+        size = (num_rows + 2) * stride
+        # 按点编号排好的Zobrist表 hash_codes[颜色, 点编号] 外围一圈填0
+        self.hash_codes = np.zeros((3, size), dtype=np.uint64)
+        for row in range(1, num_rows + 1):
+            for col in range(1, num_cols + 1):
+                point = Point(row, col)
+                index = row * stride + col
+                self.hash_codes[BLACK, index] = \
+                    zobrist.hash_code(point, Player.black)
+                self.hash_codes[WHITE, index] = \
+                    zobrist.hash_code(point, Player.white)
+        # 试探性落子用的日志 一次落子最多写 落子和合并的几十次
+        # 加上每个被提的子 两次清除和给四个邻居加伪气的十二次
+        self.trail = np.zeros((16 * size + 256, 3), dtype=np.int64)
+        # 日志长度 -1表示不记日志
+        self.trail_size = np.full(1, -1, dtype=np.int64)
+        # 数气时做记号用的临时数组
+        self.marks = np.zeros(size, dtype=np.int8)
+        # 每个编号对应的Point 边框上为None 同样的点总是同一个对象 不用反复新建
+        self.points = [None] * size
+        for row in range(1, num_rows + 1):
+            for col in range(1, num_cols + 1):
+                self.points[row * stride + col] = Point(row, col)
+        # 每个点在棋盘内的邻居编号 和对应的Point 边框上为空
+        # 有边框在 index+offset总在数组里 落在边框上的那些就是出界的
+        self.neighbors_of = [
+            tuple(index + offset
+                  for offset in (-stride, stride, -1, 1)
+                  if self.points[index + offset] is not None)
+            if point is not None else ()
+            for index, point in enumerate(self.points)]
+        self.neighbor_points = [
+            tuple(self.points[neighbor] for neighbor in neighbors)
+            for neighbors in self.neighbors_of]
+        # 每个点在棋盘内的四个斜角
+        self.corner_points = [
+            tuple(self.points[index + offset]
+                  for offset in (-stride - 1, -stride + 1,
+                                 stride - 1, stride + 1)
+                  if self.points[index + offset] is not None)
+            if point is not None else ()
+            for index, point in enumerate(self.points)]
+
+
+# Board.for_size按大小生成的子类
+_SIZED_BOARDS = {}
+
+
+# 按大小重建棋盘对象 pickle和深复制用
+# 按大小生成的子类不是模块的属性 pickle按名字找不到它们 只能经过for_size找回来
+def _sized_board(base, num_rows, num_cols):
+    return object.__new__(base.for_size(num_rows, num_cols))
+
+
+# 棋盘 数据结构对象
+# 用几个一维数组分别存每个点的属性 而不是每个点一个对象
+# 数组按 (num_rows+2) x (num_cols+2) 带边框排布 Point(row, col)的编号就是 row*(num_cols+2)+col
+# 棋块用并查集表示 落子 提子 撤销这些循环都在_board_core里用Numba编译执行
+# Board(num_rows, num_cols)实际得到的是for_size按大小生成的子类 行宽 邻居偏移和共用的表都是它的类常量
 # tag::board_init[]
 class Board():  # <1>
+    # 行宽 上下左右四个邻居的编号偏移 同样大小的棋盘共用的表
+    _stride = None
+    _neighbor_offsets = None
+    _shared = None
+
+    def __new__(cls, *args, **kwargs):
+        # 直接构造Board时换成对应大小的子类
+        if cls is Board:
+            cls = Board.for_size(*args, **kwargs)
+        return object.__new__(cls)
+
+    # pickle和深复制时经过for_size重建对象 再放回各个数组
+    def __reduce__(self):
+        return _sized_board, (Board, self.num_rows, self.num_cols), \
+            self.__dict__
+
+    # 第一次遇到某个大小时生成一个子类 把这个大小下不变的东西都放成类常量
+    @classmethod
+    def for_size(cls, num_rows, num_cols=None):
+        if num_cols is None:
+            num_cols = num_rows
+        board_class = _SIZED_BOARDS.get((num_rows, num_cols))
+        if board_class is None:
+            stride = num_cols + 2
+            board_class = type('Board%dx%d' % (num_rows, num_cols), (Board,), {
+                '_stride': stride,
+                '_neighbor_offsets': (-stride, stride, -1, 1),
+                '_shared': _SharedArrays(num_rows, num_cols),
+            })
+            _SIZED_BOARDS[num_rows, num_cols] = board_class
+        return board_class
+
     def __init__(self, num_rows, num_cols):
         # 基本参数 行列
         self.num_rows = num_rows
         self.num_cols = num_cols
-        # 棋块的集合 键是棋块中的没个点 值是棋块对象
-        self._grid = {}
+        # 每个点的颜色 外围一圈是OFF_BOARD
+        color = np.full((num_rows + 2, num_cols + 2), OFF_BOARD, dtype=np.int8)
+        color[1:-1, 1:-1] = EMPTY
+        self._color = color.reshape(-1)
+        # 并查集的父节点 沿着它走到的根就是棋块编号 根节点指向自己 空点为-1
+        self._group = np.full(color.size, -1, dtype=np.int32)
+        # 按秩合并用的秩 只对根节点有意义
+        self._rank = np.zeros(color.size, dtype=np.int32)
+        # 同一棋块的子串成一个环 不存棋子集合也能在O(k)内遍历整个棋块
+        self._next_stone = np.arange(color.size, dtype=np.int32)
+        # 根节点上的伪气 三行分别是个数 编号和 编号平方和
+        self._liberties = np.zeros((3, color.size), dtype=np.int64)
+        # 当前局面的哈希 落子和提子时增量更新
+        self._hash = zobrist.EMPTY_BOARD
 
     # <1> A board is initialized as empty grid with the specified number of rows and columns.
     # end::board_init[]
 
+    # 带边框的二维颜色数组
+    @property
+    def color(self):
+        return self._color.reshape(self.num_rows + 2, self.num_cols + 2)
+
+    # 带边框的二维并查集父节点数组
+    @property
+    def group(self):
+        return self._group.reshape(self.num_rows + 2, self.num_cols + 2)
+
+    def _index(self, point):
+        return point.row * self._stride + point.col
+
+    def _point(self, index):
+        return self._shared.points[index]
+
+    # 棋盘内的上下左右邻居 预先算好 不用每次新建Point再判断是否出界
+    def neighbors(self, point):
+        return self._shared.neighbor_points[self._index(point)]
+
+    # 棋盘内的斜角 同样预先算好 出界的斜角个数就是4减去它的长度
+    def corners(self, point):
+        return self._shared.corner_points[self._index(point)]
+
+    # 找棋块的根 查询时不做路径压缩 棋盘数组只在落子时改动 撤销记录才能一直有效
+    def find(self, index):
+        return _board_core.find_root(self._group, index)
+
+    # 沿着环列出棋块中的所有子
+    def _stones(self, root):
+        next_stone = self._next_stone
+        stones = [root]
+        index = next_stone.item(root)
+        while index != root:
+            stones.append(index)
+            index = next_stone.item(index)
+        return stones
+
     # 更新棋盘用的 输入阵营和落子点 在那个点上加上那个字 然后刷新棋块状态
-    # 棋块方法的理解入口
+    # 合并己方棋块和提掉没气的敌方棋块都在_board_core.place里完成
     # tag::board_place_0[]
     def place_stone(self, player, point):
         # assert用于错误检查 若变量为False则报错
         # 此处显然是在判断point是否在棋盘内 是否合法
         assert self.is_on_grid(point)
+        index = self._index(point)
         # 此处显然是在point的点上是不是已经有子了 如果已经有子了 则不能在此处落子
-        assert self._grid.get(point) is None
-        # 初始化
-        # 朋友数组
-        adjacent_same_color = []
-        # 敌人数组
-        adjacent_opposite_color = []
-        # 气的点？
-        liberties = []
-
-        # 遍历落子的所有邻居
-        for neighbor in point.neighbors():  # <1>
-            # 如果邻居不在棋盘内 则邻居不用被讨论了
-            if not self.is_on_grid(neighbor):
-                continue
-            # 看看这个邻居是什么子
-            neighbor_string = self._grid.get(neighbor)
-            # 如果邻居是空的 没有子 放入自由数组中
-            if neighbor_string is None:
-                liberties.append(neighbor)
-            # 如果邻居上的子是自己人 放入相邻朋友数组中
-            elif neighbor_string.color == player:
-                # 如果友方邻居不在
-                if neighbor_string not in adjacent_same_color:
-                    adjacent_same_color.append(neighbor_string)
-            # 如果邻居上的子是敌人 放入相邻敌人数组中
-            else:
-                # 如果敌方邻居不在
-                if neighbor_string not in adjacent_opposite_color:
-                    adjacent_opposite_color.append(neighbor_string)
-        # 创造新棋块
-        new_string = GoString(player, [point], liberties)
-        # <1> First, we examine direct neighbors of this point.
-        # end::board_place_0[]
-        # tag::board_place_1[]
-        # 和所有邻居所在的棋块合并
-        for same_color_string in adjacent_same_color:  # <1>
-            new_string = new_string.merged_with(same_color_string)
-        # 新棋块中的每个点录入字典 旧的值会被抹去 所有棋子都属于新的棋块了 因此旧的棋块不用删去
-        for new_string_point in new_string.stones:
-            self._grid[new_string_point] = new_string
-        # 紧住相连的敌人一口气
-        for other_color_string in adjacent_opposite_color:  # <2>
-            other_color_string.remove_liberty(point)
-        # 如果相连的敌人没气了 就被提子
-        for other_color_string in adjacent_opposite_color:  # <3>
-            if other_color_string.num_liberties == 0:
-                self._remove_string(other_color_string)
-
-    # <1> Merge any adjacent strings of the same color.
-    # <2> Reduce liberties of any adjacent strings of the opposite color.
-    # <3> If any opposite color strings now have zero liberties, remove them.
-    # end::board_place_1[]
-
-    # 似乎是棋块被杀时调用的 提子
-    # tag::board_remove[]
-    def _remove_string(self, string):
-        # 所有被杀棋块的点
-        for point in string.stones:
-            # 找到所有邻居
-            for neighbor in point.neighbors():  # <1>
-                # 如果邻居上无子 则不讨论
-                neighbor_string = self._grid.get(neighbor)
-                if neighbor_string is None:
-                    continue
-                # 若有子
-                if neighbor_string is not string:
-                    # 该子所在的棋块加长一口气
-                    neighbor_string.add_liberty(point)
-            # 该子从棋盘上抹除
-            del (self._grid[point])
+        assert self._color[index] == EMPTY
+        shared = self._shared
+        _, hash_delta = _board_core.place(
+            self._color, self._group, self._rank, self._next_stone,
+            self._liberties, shared.hash_codes, self._stride, index,
+            player.value,
+            shared.trail, shared.trail_size)
+        self._hash ^= int(hash_delta)
+
+    # end::board_place_0[]
+
+    # 试探性落子 返回撤销记录 用undo可以把棋盘还原成落子前的样子 免去深复制整个棋盘
+    def place_stone_with_undo(self, player, point):
+        record = UndoRecord(self._hash)
+        trail_size = self._shared.trail_size
+        trail_size[0] = 0
+        try:
+            self.place_stone(player, point)
+        finally:
+            size = int(trail_size[0])
+            trail_size[0] = -1
+        record.changes = self._shared.trail[:size].copy()
+        return record
 
-    # <1> Removing a string can create liberties for other strings.
-    # end::board_remove[]
+    # 把日志倒着放一遍 撤销一次落子
+    def undo(self, record):
+        _board_core.undo(
+            self._color, self._group, self._rank, self._next_stone,
+            self._liberties, record.changes, 0, len(record.changes))
+        self._hash = record.zobrist_hash
 
     # 判断一个落子点是否出界
     # tag::board_utils[]
@@ -189,56 +299,457 @@ class Board():  # <1>
         return 1 <= point.row <= self.num_rows and \
                1 <= point.col <= self.num_cols
 
-    # 判断一个落子点上是否有子 若有 是什么阵营的
+    # 判断一个落子点上是否有子 若有 是什么阵营的 出界的点返回None
+    # 远离棋盘的点编号会越过边框 甚至是负数绕到数组另一头 所以先判断出界
     def get(self, point):  # <1>
-        string = self._grid.get(point)
-        if string is None:
+        if not self.is_on_grid(point):
             return None
-        return string.color
+        return _PLAYERS[self._color.item(self._index(point))]
 
     # 输入落子点 取得该点所从属的棋块 若此处无子 则返回None
     def get_go_string(self, point):  # <2>
-        string = self._grid.get(point)
-        if string is None:
+        if not self.is_on_grid(point):
             return None
-        return string
+        index = self._index(point)
+        player = _PLAYERS[self._color.item(index)]
+        if player is None:
+            return None
+        stones = self._stones(self.find(index))
+        neighbors_of = self._shared.neighbors_of
+        liberties = set(
+            neighbor
+            for stone in stones
+            for neighbor in neighbors_of[stone]
+            if self._color.item(neighbor) == EMPTY)
+        return GoString(
+            player,
+            [self._point(stone) for stone in stones],
+            [self._point(liberty) for liberty in liberties])
 
     # <1> Returns the content of a point on the board:  a Player if there is a stone on that point or else None.
     # <2> Returns the entire string of stones at a point: a GoString if there is a stone on that point or else None.
     # end::board_utils[]
 
-    # 判断一个棋块是不是和另一个一样
+    # 输入落子点 返回该点所在棋块的气数 不必像get_go_string那样造一份快照
+    # 没气和只剩一口气直接从伪气看出来 两口以上才沿着环去数
+    # 空点和出界的点返回0
+    def num_liberties(self, point):
+        if not self.is_on_grid(point):
+            return 0
+        index = self._index(point)
+        if self._color.item(index) == EMPTY:
+            return 0
+        root = self.find(index)
+        if self._liberties.item(0, root) == 0:
+            return 0
+        if _board_core.in_atari(self._liberties, root):
+            return 1
+        return _board_core.count_liberties(
+            self._color, self._next_stone, self._shared.marks, self._stride,
+            root)
+
+    # 每个点所在棋块的气 0没气 1只剩一口气 2两口及以上 空点为0 形状同color
+    def _liberty_levels(self):
+        levels = np.empty(self._color.size, dtype=np.int8)
+        _board_core.liberty_levels(
+            self._color, self._group, self._next_stone, self._liberties,
+            levels)
+        return levels.reshape(self.num_rows + 2, self.num_cols + 2)
+
+    # 用数组运算一次性判断所有空点 返回 (不自杀的落子点, 其中会提子的标记)
+    # 有空邻居 或者连上一个还有别的气的己方棋块 或者提掉一个只剩一口气的敌方棋块 就不是自杀
+    def playable_points(self, player):
+        color = self.color
+        liberty_levels = self._liberty_levels()
+        own, opponent = player.value, player.other.value
+        has_liberty = np.zeros((self.num_rows, self.num_cols), dtype=bool)
+        captures = np.zeros((self.num_rows, self.num_cols), dtype=bool)
+        # 上下左右四个邻居各是一个错开一格的切片
+        for rows, cols in ((slice(0, -2), slice(1, -1)),
+                           (slice(2, None), slice(1, -1)),
+                           (slice(1, -1), slice(0, -2)),
+                           (slice(1, -1), slice(2, None))):
+            neighbor_color = color[rows, cols]
+            neighbor_liberties = liberty_levels[rows, cols]
+            has_liberty |= (neighbor_color == EMPTY) | \
+                ((neighbor_color == own) & (neighbor_liberties > 1))
+            captures |= (neighbor_color == opponent) & (neighbor_liberties == 1)
+        playable = (color[1:-1, 1:-1] == EMPTY) & (has_liberty | captures)
+        rows, cols = np.nonzero(playable)
+        all_points = self._shared.points
+        points = [all_points[(row + 1) * self._stride + col + 1]
+                  for row, col in zip(rows.tolist(), cols.tolist())]
+        return points, captures[rows, cols].tolist()
+
+    # 当前局面的Zobrist哈希
+    def zobrist_hash(self):
+        return self._hash
+
+    # 一手不提子的落子之后的哈希 只多了一个子 不用试下
+    def zobrist_hash_with_stone(self, player, point):
+        return self._hash ^ \
+            self._shared.hash_codes.item(player.value, self._index(point))
+
+    # 判断一个棋盘是不是和另一个一样 只需比较每个点的颜色
     def __eq__(self, other):
         return isinstance(other, Board) and \
                self.num_rows == other.num_rows and \
                self.num_cols == other.num_cols and \
-               self._grid == other._grid
+               np.array_equal(self._color, other._color)
+
+
+# 位棋盘用的表 同样大小的棋盘共用一份 挂在按大小特化的BitBoard子类上
+class _BitTables():
+    def __init__(self, num_rows, num_cols):
+        # 每行多留一位空位 左右移一位时不会从一行的末尾跑到下一行的开头
+        width = num_cols + 1
+        self.width = width
+        size = num_rows * width
+        self.board_mask = 0
+        # 每一位对应的Point 空位为None
+        self.points = [None] * size
+        for row in range(1, num_rows + 1):
+            for col in range(1, num_cols + 1):
+                index = (row - 1) * width + col - 1
+                self.board_mask |= 1 << index
+                self.points[index] = Point(row, col)
+        # 每个点的邻居组成的掩码 和对应的Point 以及棋盘内的斜角
+        self.neighbor_masks = [0] * size
+        self.neighbor_points = [()] * size
+        self.corner_points = [()] * size
+        # 按位排好的Zobrist表 hash_codes[颜色][位]
+        self.hash_codes = (None, [0] * size, [0] * size)
+        for index, point in enumerate(self.points):
+            if point is None:
+                continue
+            neighbors = [index + offset
+                         for offset in (-width, width, -1, 1)
+                         if 0 <= index + offset < size and
+                         self.points[index + offset] is not None]
+            for neighbor in neighbors:
+                self.neighbor_masks[index] |= 1 << neighbor
+            self.neighbor_points[index] = \
+                tuple(self.points[neighbor] for neighbor in neighbors)
+            self.corner_points[index] = tuple(
+                Point(point.row + delta_row, point.col + delta_col)
+                for delta_row, delta_col in ((-1, -1), (-1, 1), (1, -1), (1, 1))
+                if 1 <= point.row + delta_row <= num_rows and
+                1 <= point.col + delta_col <= num_cols)
+            self.hash_codes[BLACK][index] = \
+                zobrist.hash_code(point, Player.black)
+            self.hash_codes[WHITE][index] = \
+                zobrist.hash_code(point, Player.white)
+
+
+# BitBoard.for_size按大小生成的子类
+_SIZED_BIT_BOARDS = {}
+
+
+# 9路以下的方形棋盘用的位棋盘 接口和Board一样
+# 每个点是整数里的一位 黑白各用一个整数 Point(row, col)是第 (row-1)*(num_cols+1)+(col-1) 位
+# 找棋块 数气 提子都是移位和与或 撤销只需记下落子前的两个整数
+# 和Board一样 BitBoard(num_rows, num_cols)得到的是按大小特化的子类 9路是手写的BitBoard9
+class BitBoard():
+    # 同样大小的棋盘共用的表
+    _tables = None
+
+    def __new__(cls, *args, **kwargs):
+        if cls is BitBoard:
+            cls = BitBoard.for_size(*args, **kwargs)
+        return object.__new__(cls)
+
+    def __reduce__(self):
+        return _sized_board, (BitBoard, self.num_rows, self.num_cols), \
+            self.__dict__
+
+    @classmethod
+    def for_size(cls, num_rows, num_cols=None):
+        if num_cols is None:
+            num_cols = num_rows
+        board_class = _SIZED_BIT_BOARDS.get((num_rows, num_cols))
+        if board_class is None:
+            board_class = type(
+                'BitBoard%dx%d' % (num_rows, num_cols), (BitBoard,),
+                {'_tables': _BitTables(num_rows, num_cols)})
+            _SIZED_BIT_BOARDS[num_rows, num_cols] = board_class
+        return board_class
+
+    def __init__(self, num_rows, num_cols):
+        # 基本参数 行列
+        self.num_rows = num_rows
+        self.num_cols = num_cols
+        # 黑子和白子
+        self.black = 0
+        self.white = 0
+        # 当前局面的哈希 落子和提子时增量更新
+        self._hash = zobrist.EMPTY_BOARD
+
+    def _index(self, point):
+        return (point.row - 1) * self._tables.width + point.col - 1
+
+    # 所有子往上下左右各移一格 不包括原来的位置
+    def _spread(self, stones):
+        width = self._tables.width
+        return ((stones << 1) | (stones >> 1) |
+                (stones << width) | (stones >> width)) & \
+            self._tables.board_mask
+
+    # 从seed出发在stones里不断向外扩张 直到不再变大 得到seed所在的棋块
+    def _flood(self, seed, stones):
+        group = seed
+        while True:
+            grown = (group | self._spread(group)) & stones
+            if grown == group:
+                return group
+            group = grown
+
+    # 一组位对应的Point
+    def _points(self, stones):
+        points = []
+        while stones:
+            low = stones & -stones
+            stones ^= low
+            points.append(self._tables.points[low.bit_length() - 1])
+        return points
+
+    # 一组子的Zobrist哈希
+    def _stones_hash(self, stones, color):
+        hash_codes = self._tables.hash_codes[color]
+        stones_hash = 0
+        while stones:
+            low = stones & -stones
+            stones ^= low
+            stones_hash ^= hash_codes[low.bit_length() - 1]
+        return stones_hash
+
+    def _empty(self):
+        return self._tables.board_mask & ~(self.black | self.white)
+
+    # 更新棋盘用的 输入阵营和落子点 在那个点上加上那个字 然后提掉没气的敌方棋块
+    def place_stone(self, player, point):
+        assert self.is_on_grid(point)
+        index = self._index(point)
+        stone = 1 << index
+        assert not (self.black | self.white) & stone
+        tables = self._tables
+        if player == Player.black:
+            own, opponent = self.black | stone, self.white
+        else:
+            own, opponent = self.white | stone, self.black
+        self._hash ^= tables.hash_codes[player.value][index]
+        empty = tables.board_mask & ~(own | opponent)
+        # 逐个看相邻的敌方棋块 同一棋块的其他邻居直接跳过
+        neighbors = tables.neighbor_masks[index] & opponent
+        while neighbors:
+            group = self._flood(neighbors & -neighbors, opponent)
+            neighbors &= ~group
+            if not self._spread(group) & empty:
+                opponent &= ~group
+                empty |= group
+                self._hash ^= self._stones_hash(group, player.other.value)
+        if player == Player.black:
+            self.black, self.white = own, opponent
+        else:
+            self.white, self.black = own, opponent
+
+    # 试探性落子 返回撤销记录 记下落子前的黑白两个整数就够了
+    def place_stone_with_undo(self, player, point):
+        record = UndoRecord(self._hash)
+        record.changes = (self.black, self.white)
+        self.place_stone(player, point)
+        return record
+
+    def undo(self, record):
+        self.black, self.white = record.changes
+        self._hash = record.zobrist_hash
+
+    # 判断一个落子点是否出界
+    def is_on_grid(self, point):
+        return 1 <= point.row <= self.num_rows and \
+               1 <= point.col <= self.num_cols
+
+    # 判断一个落子点上是否有子 若有 是什么阵营的 出界的点返回None
+    # 出界的点位号可能是负数 不能拿来移位 所以先判断出界
+    def get(self, point):
+        if not self.is_on_grid(point):
+            return None
+        stone = 1 << self._index(point)
+        if self.black & stone:
+            return Player.black
+        if self.white & stone:
+            return Player.white
+        return None
+
+    # 输入落子点 取得该点所从属的棋块 若此处无子 则返回None
+    def get_go_string(self, point):
+        player = self.get(point)
+        if player is None:
+            return None
+        stones = self.black if player == Player.black else self.white
+        group = self._flood(1 << self._index(point), stones)
+        liberties = self._spread(group) & self._empty()
+        return GoString(player, self._points(group), self._points(liberties))
+
+    # 输入落子点 返回该点所在棋块的气数
+    # 空点和出界的点返回0 和Board一样
+    def num_liberties(self, point):
+        if not self.is_on_grid(point):
+            return 0
+        stone = 1 << self._index(point)
+        if self.black & stone:
+            stones = self.black
+        elif self.white & stone:
+            stones = self.white
+        else:
+            return 0
+        group = self._flood(stone, stones)
+        # int.bit_count要Python 3.10 这里用bin数1的个数
+        return bin(self._spread(group) & self._empty()).count('1')
+
+    # 棋盘内的上下左右邻居
+    def neighbors(self, point):
+        return self._tables.neighbor_points[self._index(point)]
+
+    # 棋盘内的斜角
+    def corners(self, point):
+        return self._tables.corner_points[self._index(point)]
+
+    # 和Board.playable_points一样 返回 (不自杀的落子点, 其中会提子的标记)
+    # 空点的邻居 有两口气以上的己方棋块的气 只剩一口气的敌方棋块的那口气 都可以下
+    def playable_points(self, player):
+        if player == Player.black:
+            own, opponent = self.black, self.white
+        else:
+            own, opponent = self.white, self.black
+        empty = self._empty()
+        safe = self._spread(empty)
+        captures = 0
+        remaining = own
+        while remaining:
+            group = self._flood(remaining & -remaining, own)
+            remaining &= ~group
+            liberties = self._spread(group) & empty
+            if liberties & (liberties - 1):
+                safe |= liberties
+        remaining = opponent
+        while remaining:
+            group = self._flood(remaining & -remaining, opponent)
+            remaining &= ~group
+            liberties = self._spread(group) & empty
+            if not liberties & (liberties - 1):
+                captures |= liberties
+        points = self._points(empty & (safe | captures))
+        return points, [bool(captures & (1 << self._index(point)))
+                        for point in points]
+
+    # 当前局面的Zobrist哈希
+    def zobrist_hash(self):
+        return self._hash
+
+    # 一手不提子的落子之后的哈希 只多了一个子 不用试下
+    def zobrist_hash_with_stone(self, player, point):
+        return self._hash ^ \
+            self._tables.hash_codes[player.value][self._index(point)]
+
+    # 判断一个棋盘是不是和另一个一样
+    def __eq__(self, other):
+        return isinstance(other, BitBoard) and \
+               self.num_rows == other.num_rows and \
+               self.num_cols == other.num_cols and \
+               self.black == other.black and \
+               self.white == other.white
+
+
+# 9路位棋盘的棋盘掩码 每行9位加1位空位
+_BOARD9_MASK = sum(0b111111111 << (10 * row) for row in range(9))
+
+
+# 9路棋盘专用的位棋盘 行宽10和掩码都写成常数 四个方向的移位直接展开
+# 定义时就带上9路的表 直接构造BitBoard9也能用
+class BitBoard9(BitBoard):
+    _tables = _BitTables(9, 9)
+
+    def _index(self, point):
+        return point.row * 10 + point.col - 11
+
+    def _spread(self, stones):
+        return ((stones << 1) | (stones >> 1) |
+                (stones << 10) | (stones >> 10)) & _BOARD9_MASK
+
+    def _flood(self, seed, stones):
+        group = seed
+        while True:
+            grown = (group | (group << 1) | (group >> 1) |
+                     (group << 10) | (group >> 10)) & stones
+            if grown == group:
+                return group
+            group = grown
+
+    def _empty(self):
+        return _BOARD9_MASK & ~(self.black | self.white)
+
+
+_SIZED_BIT_BOARDS[9, 9] = BitBoard9
+
+
+# 动作的种类
+_PLAY = 0
+_PASS = 1
+_RESIGN = 2
 
 
 # 数据结构 动作 交给棋盘处理的数据结构 具有落子 pass 和 认输 三个互斥状态
+# 三个状态用一个整数kind表示 is_play等是由它得到的只读属性
 # tag::moves[]
 class Move():  # <1>
+    __slots__ = ('point', 'kind')
+
     def __init__(self, point=None, is_pass=False, is_resign=False):
         assert (point is not None) ^ is_pass ^ is_resign
         self.point = point
-        self.is_play = (self.point is not None)
-        self.is_pass = is_pass
-        self.is_resign = is_resign
+        if point is not None:
+            self.kind = _PLAY
+        elif is_pass:
+            self.kind = _PASS
+        else:
+            self.kind = _RESIGN
+
+    @property
+    def is_play(self):
+        return self.kind == _PLAY
 
+    @property
+    def is_pass(self):
+        return self.kind == _PASS
+
+    @property
+    def is_resign(self):
+        return self.kind == _RESIGN
+
+    # 下面三个工厂方法直接设置两个属性 不走__init__里的检查
     # 用于得到落子动作的数据结构 输入一个point数据结构 输出一个point状态的move
     @classmethod
     def play(cls, point):  # <2>
-        return Move(point=point)
+        move = cls.__new__(cls)
+        move.point = point
+        move.kind = _PLAY
+        return move
 
     # 用于得到pass动作的数据结构
     @classmethod
     def pass_turn(cls):  # <3>
-        return Move(is_pass=True)
+        move = cls.__new__(cls)
+        move.point = None
+        move.kind = _PASS
+        return move
 
     # 用于得到认输动作的数据结构
     @classmethod
     def resign(cls):  # <4>
-        return Move(is_resign=True)
+        move = cls.__new__(cls)
+        move.point = None
+        move.kind = _RESIGN
+        return move
 
 
 # <1> Any action a player can play on a turn, either is_play, is_pass or is_resign will be set.
@@ -248,40 +759,206 @@ class Move():  # <1>
 # end::moves[]
 
 
+# 同一局棋的各个状态共用一个棋盘 state是棋盘当前摆着的那个状态
+class _BoardCursor():
+    __slots__ = ('board', 'state')
+
+    def __init__(self, board, state):
+        self.board = board
+        self.state = state
+
+
+# 复制一个棋盘 数组各自复制一份 其余的属性都是不可变的值 直接共用
+def _copy_board(board):
+    copied = object.__new__(type(board))
+    copied.__dict__.update(
+        (name, value.copy() if isinstance(value, np.ndarray) else value)
+        for name, value in board.__dict__.items())
+    return copied
+
+
+# GameState.board返回的只读棋盘 每次读之前都把共用的棋盘摆回自己的状态
+# 拿到它之后再去访问别的状态 它看到的仍是自己那个状态的局面
+# 落子 撤销这些会改动共用棋盘的方法一律报错 落子只能经过GameState.apply_move
+class _BoardView():
+    __slots__ = ('_state',)
+
+    def __init__(self, state):
+        self._state = state
+
+    @property
+    def num_rows(self):
+        return self._state._cursor.board.num_rows
+
+    @property
+    def num_cols(self):
+        return self._state._cursor.board.num_cols
+
+    def place_stone(self, player, point):
+        raise TypeError('GameState.board is read-only, use apply_move')
+
+    def place_stone_with_undo(self, player, point):
+        raise TypeError('GameState.board is read-only, use apply_move')
+
+    def undo(self, record):
+        raise TypeError('GameState.board is read-only, use apply_move')
+
+    def is_on_grid(self, point):
+        return self._state._cursor.board.is_on_grid(point)
+
+    def get(self, point):
+        return self._state._seated_board().get(point)
+
+    def get_go_string(self, point):
+        return self._state._seated_board().get_go_string(point)
+
+    def num_liberties(self, point):
+        return self._state._seated_board().num_liberties(point)
+
+    def neighbors(self, point):
+        return self._state._cursor.board.neighbors(point)
+
+    def corners(self, point):
+        return self._state._cursor.board.corners(point)
+
+    def playable_points(self, player):
+        return self._state._seated_board().playable_points(player)
+
+    def zobrist_hash(self):
+        return self._state._seated_board().zobrist_hash()
+
+    def zobrist_hash_with_stone(self, player, point):
+        return self._state._seated_board().zobrist_hash_with_stone(
+            player, point)
+
+    # 每个点上的子 比较同一局棋两个状态的棋盘时用
+    def _stones(self):
+        board = self._state._seated_board()
+        return [board.get(Point(row, col))
+                for row in range(1, board.num_rows + 1)
+                for col in range(1, board.num_cols + 1)]
+
+    def __eq__(self, other):
+        if isinstance(other, _BoardView):
+            # 同一局棋的两个状态共用一个棋盘 不能直接比 先比哈希再逐点比
+            if other._state._cursor is self._state._cursor:
+                return self.num_rows == other.num_rows and \
+                    self.num_cols == other.num_cols and \
+                    self.zobrist_hash() == other.zobrist_hash() and \
+                    self._stones() == other._stones()
+            other = other._state._seated_board()
+        return self._state._seated_board() == other
+
+
 # 棋盘 储存棋盘状态 储存落子顺序 处理move和更新棋盘
+# 同一局棋的所有状态共用一个棋盘 每个状态记着从上一状态落子时的撤销记录
+# 用到棋盘时 先沿着状态链撤销或重放落子 把棋盘摆回这个状态
+# 对外的board是只读的_BoardView 传给GameState的棋盘从此归这局棋所有 不要再直接改动它
 # tag::game_state[]
 class GameState():
+    __slots__ = ('_cursor', '_undo_to_parent', '_depth', '_board_view',
+                 'next_player', 'previous_state', 'past_hashes', 'last_move',
+                 '_legal_cache')
+
     def __init__(self, board, next_player, previous, move):
-        # 棋盘状态
-        self.board = board
+        # 棋盘状态 和上一状态是同一个棋盘（或者就是它的board）时共用它的游标
+        if previous is not None and (previous._cursor.board is board or
+                                     previous._board_view is board):
+            self._cursor = previous._cursor
+        else:
+            # 别的状态的只读棋盘 复制一份它的局面给这局棋自己用
+            if isinstance(board, _BoardView):
+                board = _copy_board(board._state._seated_board())
+            self._cursor = _BoardCursor(board, self)
+        # 对外的只读棋盘 第一次访问board时才建
+        self._board_view = None
+        # 从上一状态落子到这个状态的撤销记录 停一手 认输和开局为None
+        self._undo_to_parent = None
+        # 离开局的步数 找两个状态的共同祖先时用
+        self._depth = 0 if previous is None else previous._depth + 1
         # 落子顺序
         self.next_player = next_player
         # 储存前一状态 用链的形式储存棋谱（状态） 也就是上一个自己
         self.previous_state = previous
+        # 之前出现过的所有局面的哈希（已经异或上轮到谁下） 判断劫时不必沿着链逐个比较
+        # 各个状态共用前面的集合 previous_state只剩is_over还要用
+        if previous is None:
+            self.past_hashes = frozenset()
+        else:
+            self.past_hashes = previous.past_hashes | {previous.situation}
         # 储存上一move
         self.last_move = move
+        # is_valid_move问过的落子点 第一次用到时才建
+        self._legal_cache = None
+
+    # 棋盘 只读 访问别的状态的棋盘后 这里拿到的棋盘看到的局面不会跟着变
+    @property
+    def board(self):
+        if self._board_view is None:
+            self._board_view = _BoardView(self)
+        return self._board_view
+
+    # 把共用的棋盘摆回这个状态再返回 只在GameState和_BoardView内部用
+    def _seated_board(self):
+        cursor = self._cursor
+        if cursor.state is not self:
+            self._seat_board(cursor)
+        return cursor.board
+
+    # 把共用的棋盘从cursor.state摆到这个状态
+    # 先从两边退到共同的祖先 再撤销当前状态一侧的落子 重放这个状态一侧的落子
+    def _seat_board(self, cursor):
+        board = cursor.board
+        current = cursor.state
+        target = self
+        replay = []
+        while current._depth > target._depth:
+            if current._undo_to_parent is not None:
+                board.undo(current._undo_to_parent)
+            current = current.previous_state
+        while target._depth > current._depth:
+            replay.append(target)
+            target = target.previous_state
+        while current is not target:
+            if current._undo_to_parent is not None:
+                board.undo(current._undo_to_parent)
+            current = current.previous_state
+            replay.append(target)
+            target = target.previous_state
+        # 重放时重新生成撤销记录 记录和棋盘数组逐位对应
+        for state in reversed(replay):
+            if state.last_move.is_play:
+                state._undo_to_parent = board.place_stone_with_undo(
+                    state.previous_state.next_player, state.last_move.point)
+        cursor.state = self
 
     # 以move更新棋盘
     def apply_move(self, move):  # <1>
-        # 创建一个next_board变量 作为下一个状态的棋盘
+        # 共用的棋盘 先摆回这个状态
+        board = self._seated_board()
+        # 返回下一个状态 注意返回了一个新的GameState对象
+        next_state = GameState(board, self.next_player.other, self, move)
+        # 下一个状态必须共用这个棋盘 换成复制的棋盘就丢掉了撤销记录 调试时在这里报错
+        assert next_state._cursor is self._cursor
         if move.is_play:
-            # 如果落子了 就把落子点加上
-            # 深复制棋盘 加上新子
-            next_board = copy.deepcopy(self.board)
+            # 如果落子了 就在共用的棋盘上落子 撤销记录留给下一个状态
             # 注意place_stone这个方法 落子更新棋块 使得棋盘变成船新的棋盘
-            next_board.place_stone(self.next_player, move.point)
-        else:
-            # 如果没落子 就棋盘原封不动
-            next_board = self.board
-        # 返回下一个状态 注意返回了一个新的GameState对象
-        return GameState(next_board, self.next_player.other, self, move)
+            next_state._undo_to_parent = board.place_stone_with_undo(
+                self.next_player, move.point)
+            self._cursor.state = next_state
+        # 如果没落子 就棋盘原封不动
+        return next_state
 
     # 生成一个初始状态 自己生成自己的类方法
     @classmethod
     def new_game(cls, board_size):
         if isinstance(board_size, int):
             board_size = (board_size, board_size)
-        board = Board(*board_size)
+        # 9路以下的方形棋盘用位棋盘
+        if board_size[0] == board_size[1] <= 9:
+            board = BitBoard(*board_size)
+        else:
+            board = Board(*board_size)
         return GameState(board, Player.black, None, None)
 
     # <1> Return the new GameState after applying the move.
@@ -292,30 +969,34 @@ class GameState():
     def is_move_self_capture(self, player, move):
         if not move.is_play:
             return False
-        next_board = copy.deepcopy(self.board)
-        next_board.place_stone(player, move.point)
-        new_string = next_board.get_go_string(move.point)
-        return new_string.num_liberties == 0
+        # 直接在当前棋盘上试下一步 看完结果再撤销
+        board = self._seated_board()
+        record = board.place_stone_with_undo(player, move.point)
+        is_self_capture = board.num_liberties(move.point) == 0
+        board.undo(record)
+        return is_self_capture
 
     # end::self_capture[]
 
     # tag::is_ko[]
+    # 局面哈希 包括轮到谁下
     @property
     def situation(self):
-        return (self.next_player, self.board)
+        return self._seated_board().zobrist_hash() ^ \
+            zobrist.TURN_CODE[self.next_player]
 
     def does_move_violate_ko(self, player, move):
         if not move.is_play:
             return False
-        next_board = copy.deepcopy(self.board)
-        next_board.place_stone(player, move.point)
-        next_situation = (player.other, next_board)
-        past_state = self.previous_state
-        while past_state is not None:
-            if past_state.situation == next_situation:
-                return True
-            past_state = past_state.previous_state
-        return False
+        # 之前没有任何局面 不可能重复 开局的棋盘上可能已经有子 所以只能看past_hashes
+        if not self.past_hashes:
+            return False
+        board = self._seated_board()
+        record = board.place_stone_with_undo(player, move.point)
+        next_situation = \
+            board.zobrist_hash() ^ zobrist.TURN_CODE[player.other]
+        board.undo(record)
+        return next_situation in self.past_hashes
 
     # end::is_ko[]
 
@@ -326,10 +1007,17 @@ class GameState():
             return False
         if move.is_pass or move.is_resign:
             return True
-        return (
-                self.board.get(move.point) is None and
+        # 同一个状态下再问同一个点 直接用上次的结果
+        if self._legal_cache is None:
+            self._legal_cache = {}
+        is_valid = self._legal_cache.get(move.point)
+        if is_valid is None:
+            is_valid = (
+                self._seated_board().get(move.point) is None and
                 not self.is_move_self_capture(self.next_player, move) and
                 not self.does_move_violate_ko(self.next_player, move))
+            self._legal_cache[move.point] = is_valid
+        return is_valid
 
     # end::is_valid_move[]
     # 如果连续两次pass 则结束
@@ -354,11 +1042,23 @@ class GameState():
     def legal_moves(self):
         moves = []
 
-        for row in range(1, self.board.num_rows + 1):
-            for col in range(1, self.board.num_cols + 1):
-                move = Move.play(Point(row, col))
-                if self.is_valid_move(move):
-                    moves.append(move)
+        if not self.is_over():
+            # 自杀点已经批量排除 剩下的只需判断劫
+            player = self.next_player
+            board = self._seated_board()
+            points, captures = board.playable_points(player)
+            turn_code = zobrist.TURN_CODE[player.other]
+            for point, is_capture in zip(points, captures):
+                move = Move.play(point)
+                # 会提子的点只有少数几个 试下一步再撤销
+                if is_capture:
+                    if self.does_move_violate_ko(player, move):
+                        continue
+                # 不提子的落子后的哈希直接算出来
+                elif (board.zobrist_hash_with_stone(player, point) ^
+                      turn_code) in self.past_hashes:
+                    continue
+                moves.append(move)
         # These two moves are always legal.
         moves.append(Move.pass_turn())
         moves.append(Move.resign())
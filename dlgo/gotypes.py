@@ -12,6 +12,9 @@ class Player(enum.Enum):
 
 
 class Point(namedtuple('Point', 'row col')):
+    # 子类不加__slots__的话每个Point都会多一个__dict__
+    __slots__ = ()
+
     def neighbors(self):
         return [
             Point(self.row - 1, self.col),
@@ -113,11 +113,7 @@ def _collect_region(start_pos, board, visited=None):
     all_borders = set()
     visited[start_pos] = True
     here = board.get(start_pos)
-    deltas = [(-1, 0), (1, 0), (0, -1), (0, 1)]
-    for delta_r, delta_c in deltas:
-        next_p = Point(row=start_pos.row + delta_r, col=start_pos.col + delta_c)
-        if not board.is_on_grid(next_p):
-            continue
+    for next_p in board.neighbors(start_pos):
         neighbor = board.get(next_p)
         if neighbor == here:
             points, borders = _collect_region(next_p, board, visited)
@@ -1,6 +1,8 @@
+import numpy as np
+
 from dlgo.gotypes import Player, Point
 
-__all__ = ['HASH_CODE', 'EMPTY_BOARD']
+__all__ = ['HASH_CODE', 'EMPTY_BOARD', 'TURN_CODE', 'hash_code']
 
 HASH_CODE = {
     (Point(row=1, col=1), None): 6402364705153495313,
@@ -1089,3 +1091,19 @@ HASH_CODE = {
 }
 
 EMPTY_BOARD = 9181944435492932548
+
+TURN_CODE = {
+    Player.black: 0,
+    Player.white: 6429446338170414007,
+}
+
+
+# 取一个点上放player的子的哈希值 HASH_CODE只覆盖19路棋盘
+# 超出19路的点用SeedSequence按 (行, 列, 颜色) 现生成 同一个点总是得到同一个值
+def hash_code(point, player):
+    code = HASH_CODE.get((point, player))
+    if code is None:
+        seed = np.random.SeedSequence(
+            0, spawn_key=(point.row, point.col, player.value))
+        code = int(seed.generate_state(1, dtype=np.uint64)[0])
+    return code
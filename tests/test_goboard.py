@@ -0,0 +1,290 @@
+import pickle
+import random
+import unittest
+
+from dlgo.goboard_slow import BitBoard, BitBoard9, Board, GameState, Move
+from dlgo.gotypes import Player, Point
+
+
+# 按规则直接写出来的参考实现 棋盘就是 {(row, col): Player} 的字典 不可变 方便分叉
+# 劫按局面判断 和最早那版用深复制的GameState一样：下完后的 (轮到谁下, 棋盘) 不能和之前任何一个状态相同
+class _ReferenceState():
+    def __init__(self, num_rows, num_cols, grid, next_player, history,
+                 last_moves):
+        self.num_rows = num_rows
+        self.num_cols = num_cols
+        self.grid = grid
+        self.next_player = next_player
+        # 之前所有状态的 (轮到谁下, 棋盘) 不含当前状态
+        self.history = history
+        # 最后两步 判断连续两次pass
+        self.last_moves = last_moves
+
+    @classmethod
+    def new_game(cls, num_rows, num_cols):
+        return cls(num_rows, num_cols, {}, Player.black, frozenset(), ())
+
+    @property
+    def situation(self):
+        return self.next_player, frozenset(self.grid.items())
+
+    def is_over(self):
+        if self.last_moves and self.last_moves[-1] == 'resign':
+            return True
+        return self.last_moves[-2:] == ('pass', 'pass')
+
+    def _neighbors(self, point):
+        row, col = point
+        return [(r, c) for r, c in
+                ((row - 1, col), (row + 1, col), (row, col - 1), (row, col + 1))
+                if 1 <= r <= self.num_rows and 1 <= c <= self.num_cols]
+
+    # 返回point所在棋块的子和气
+    def group(self, grid, point):
+        color = grid[point]
+        stones = {point}
+        liberties = set()
+        frontier = [point]
+        while frontier:
+            for neighbor in self._neighbors(frontier.pop()):
+                if neighbor not in grid:
+                    liberties.add(neighbor)
+                elif grid[neighbor] == color and neighbor not in stones:
+                    stones.add(neighbor)
+                    frontier.append(neighbor)
+        return stones, liberties
+
+    # 落子并提掉没气的敌方棋块 自杀的子留在棋盘上
+    def _place(self, player, point):
+        grid = dict(self.grid)
+        grid[point] = player
+        for neighbor in self._neighbors(point):
+            if grid.get(neighbor) == player.other:
+                stones, liberties = self.group(grid, neighbor)
+                if not liberties:
+                    for stone in stones:
+                        del grid[stone]
+        return grid
+
+    def legal_points(self):
+        if self.is_over():
+            return set()
+        points = set()
+        for row in range(1, self.num_rows + 1):
+            for col in range(1, self.num_cols + 1):
+                point = (row, col)
+                if point in self.grid:
+                    continue
+                grid = self._place(self.next_player, point)
+                if not self.group(grid, point)[1]:
+                    continue
+                if (self.next_player.other, frozenset(grid.items())) in \
+                        self.history:
+                    continue
+                points.add(point)
+        return points
+
+    def apply_move(self, move):
+        if move.is_play:
+            point = (move.point.row, move.point.col)
+            grid = self._place(self.next_player, point)
+            name = 'play'
+        else:
+            grid = self.grid
+            name = 'pass' if move.is_pass else 'resign'
+        return _ReferenceState(
+            self.num_rows, self.num_cols, grid, self.next_player.other,
+            self.history | {self.situation}, (self.last_moves + (name,))[-2:])
+
+
+def _new_game(board_class, size):
+    return GameState(board_class(size, size), Player.black, None, None)
+
+
+class GoBoardTest(unittest.TestCase):
+    # 逐点比较棋盘内容 每个子所在棋块的子和气 以及所有合法落子点
+    def assert_same(self, state, reference):
+        board = state.board
+        for row in range(1, reference.num_rows + 1):
+            for col in range(1, reference.num_cols + 1):
+                point = Point(row, col)
+                self.assertEqual(board.get(point),
+                                 reference.grid.get((row, col)))
+                if (row, col) not in reference.grid:
+                    continue
+                stones, liberties = reference.group(reference.grid, (row, col))
+                string = board.get_go_string(point)
+                self.assertEqual(set(string.stones),
+                                 set(map(Point._make, stones)))
+                self.assertEqual(set(string.liberties),
+                                 set(map(Point._make, liberties)))
+                self.assertEqual(board.num_liberties(point), len(liberties))
+        legal = reference.legal_points()
+        self.assertEqual(
+            set((move.point.row, move.point.col)
+                for move in state.legal_moves() if move.is_play),
+            legal)
+        for row in range(1, reference.num_rows + 1):
+            for col in range(1, reference.num_cols + 1):
+                self.assertEqual(
+                    state.is_valid_move(Move.play(Point(row, col))),
+                    (row, col) in legal)
+        self.assertEqual(state.is_over(), reference.is_over())
+
+    def random_move(self, rng, state):
+        moves = [move for move in state.legal_moves() if move.is_play]
+        if not moves or rng.random() < 0.03:
+            return Move.pass_turn()
+        return rng.choice(moves)
+
+    def test_random_games_match_reference(self):
+        rng = random.Random(0)
+        for board_class in (Board, BitBoard):
+            for size in (3, 4, 5, 7, 9):
+                for _ in range(2):
+                    state = _new_game(board_class, size)
+                    reference = _ReferenceState.new_game(size, size)
+                    for _ in range(120):
+                        self.assert_same(state, reference)
+                        if state.is_over():
+                            break
+                        move = self.random_move(rng, state)
+                        state = state.apply_move(move)
+                        reference = reference.apply_move(move)
+
+    # 在之前的状态上分叉 再打乱顺序回头看每个状态 检查共用的棋盘能正确地撤销和重放
+    def test_branching_games_match_reference(self):
+        rng = random.Random(1)
+        for board_class in (Board, BitBoard):
+            for size in (4, 5, 9):
+                pairs = [(_new_game(board_class, size),
+                          _ReferenceState.new_game(size, size))]
+                for _ in range(150):
+                    if rng.random() < 0.3:
+                        state, reference = rng.choice(pairs)
+                    else:
+                        state, reference = pairs[-1]
+                    if state.is_over():
+                        continue
+                    self.assert_same(state, reference)
+                    move = self.random_move(rng, state)
+                    pairs.append((state.apply_move(move),
+                                  reference.apply_move(move)))
+                for state, reference in rng.sample(pairs, len(pairs)):
+                    self.assert_same(state, reference)
+
+    def test_held_board_keeps_its_position(self):
+        for size in (9, 13):
+            first = GameState.new_game(size)
+            second = first.apply_move(Move.play(Point(3, 3)))
+            board = second.board
+            self.assertIsNone(first.board.get(Point(3, 3)))
+            self.assertEqual(board.get(Point(3, 3)), Player.black)
+            self.assertFalse(second.previous_state.board == second.board)
+            passed = second.apply_move(Move.pass_turn())
+            self.assertTrue(passed.board == second.board)
+
+    def test_board_is_read_only(self):
+        for size in (9, 13):
+            first = GameState.new_game(size)
+            second = first.apply_move(Move.play(Point(3, 3)))
+            with self.assertRaises(TypeError):
+                second.board.place_stone(Player.white, Point(5, 5))
+            self.assertIsNone(first.board.get(Point(5, 5)))
+            self.assertIsNone(second.board.get(Point(5, 5)))
+
+    # 用别的状态的board开一局新棋 新棋有自己的棋盘 两边互不影响
+    def test_new_game_from_another_states_board(self):
+        for size in (9, 13):
+            first = GameState.new_game(size).apply_move(
+                Move.play(Point(3, 3)))
+            root = GameState(first.board, Player.white, None, None)
+            second = root.apply_move(Move.play(Point(4, 4)))
+            self.assertEqual(second.board.get(Point(3, 3)), Player.black)
+            self.assertEqual(second.board.get(Point(4, 4)), Player.white)
+            self.assertIsNone(root.board.get(Point(4, 4)))
+            self.assertIsNone(first.board.get(Point(4, 4)))
+            self.assertTrue(root.board == first.board)
+
+    def test_off_board_points(self):
+        for board_class in (Board, BitBoard):
+            for size in (5, 9, 13):
+                board = board_class(size, size)
+                board.place_stone(Player.black, Point(size - 1, 2))
+                board.place_stone(Player.white, Point(1, 1))
+                for point in (Point(0, 1), Point(-3, 2), Point(1, 0),
+                              Point(size + 1, 1), Point(1, size + 1),
+                              Point(-100, -100)):
+                    self.assertIsNone(board.get(point))
+                    self.assertIsNone(board.get_go_string(point))
+
+    # 空点和出界的点没有棋块 两种棋盘都返回0
+    def test_num_liberties_of_empty_and_off_board_points(self):
+        for board_class in (Board, BitBoard):
+            board = board_class(5, 5)
+            board.place_stone(Player.white, Point(1, 2))
+            state = GameState(board, Player.black, None, None)
+            for point in (Point(1, 1), Point(3, 3), Point(0, 1),
+                          Point(-3, 2), Point(6, 6)):
+                self.assertEqual(board.num_liberties(point), 0)
+                self.assertEqual(state.board.num_liberties(point), 0)
+            self.assertEqual(state.board.num_liberties(Point(1, 2)), 3)
+
+    def test_pickle_round_trip(self):
+        rng = random.Random(2)
+        for size in (5, 9, 13):
+            state = GameState.new_game(size)
+            for _ in range(20):
+                state = state.apply_move(self.random_move(rng, state))
+            loaded = pickle.loads(pickle.dumps(state))
+            self.assertIs(type(loaded.board._state._cursor.board),
+                          type(state.board._state._cursor.board))
+            self.assertTrue(loaded.board == state.board)
+            self.assertEqual(
+                [move.point for move in loaded.legal_moves()],
+                [move.point for move in state.legal_moves()])
+
+    # 超出19路的点也能落子 查询 并且有自己的哈希值
+    def test_boards_larger_than_19(self):
+        for size, far, other in ((21, Point(21, 20), Point(20, 21)),
+                                 ((9, 25), Point(9, 25), Point(8, 25))):
+            start = GameState.new_game(size)
+            state = start.apply_move(Move.play(far))
+            self.assertEqual(state.board.get(far), Player.black)
+            string = state.board.get_go_string(far)
+            self.assertEqual(set(string.stones), {far})
+            self.assertEqual(set(string.liberties),
+                             set(start.board.neighbors(far)))
+            self.assertNotEqual(state.board.zobrist_hash(),
+                                start.board.zobrist_hash())
+            self.assertNotEqual(
+                state.board.zobrist_hash(),
+                start.apply_move(Move.play(other)).board.zobrist_hash())
+            self.assertFalse(state.is_valid_move(Move.play(far)))
+            self.assertTrue(state.is_valid_move(Move.play(other)))
+
+    # 从摆好子的棋盘开局 第一手提劫后 对方马上提回就回到了开局的局面
+    def test_ko_on_a_preset_board(self):
+        for board_class in (Board, BitBoard):
+            board = board_class(5, 5)
+            for point in ((1, 2), (2, 1), (3, 2)):
+                board.place_stone(Player.white, Point(*point))
+            for point in ((2, 2), (1, 3), (3, 3), (2, 4)):
+                board.place_stone(Player.black, Point(*point))
+            first = GameState(board, Player.white, None, None)
+            second = first.apply_move(Move.play(Point(2, 3)))
+            self.assertIsNone(second.board.get(Point(2, 2)))
+            recapture = Move.play(Point(2, 2))
+            self.assertFalse(second.is_valid_move(recapture))
+            self.assertNotIn(Point(2, 2), [move.point
+                                           for move in second.legal_moves()])
+
+    def test_bitboard9_without_factory(self):
+        board = BitBoard9(9, 9)
+        board.place_stone(Player.black, Point(1, 1))
+        self.assertEqual(board.get(Point(1, 1)), Player.black)
+        self.assertEqual(board.num_liberties(Point(1, 1)), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()